@@ -1,12 +1,69 @@
-from flask import Flask, request, jsonify
+import json
+import re
+from datetime import date
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import batch
 import engine
+import profiling
+import sessions
+import upstream
 from flask_cors import CORS
 from config import Config
-from errors import RequestValidationError, OpenAIError, ProcessingError
+from errors import (
+    RequestValidationError,
+    OpenAIError,
+    OverloadedError,
+    ProcessingError,
+)
 
 app = Flask(__name__)
 CORS(app, origins=Config.CORS_ALLOWED_ORIGINS)
 
+if Config.STARTUP_MODE == "eager":
+    engine.get_resources()
+elif Config.STARTUP_MODE == "background":
+    engine.warm_up()
+
+FILTER_FIELDS = ("episode", "guest", "published_after", "published_before")
+DATE_FILTER_FIELDS = ("published_after", "published_before")
+# Dates are compared as strings against the episodes' YYYY-MM-DD dates, so other ISO forms are rejected
+DATE_FILTER_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+DEFAULT_RECOMMENDATIONS = 5
+MAX_RECOMMENDATIONS = 20
+
+
+def validate_filters(filters):
+    """
+    Validates the optional 'filters' field of a request payload.
+
+    Parameters:
+    - filters (dict): The metadata filters to restrict the context search to.
+
+    Raises:
+    - RequestValidationError: If the validation checks fail.
+    """
+    if not isinstance(filters, dict):
+        raise RequestValidationError("The 'filters' field must be an object.")
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise RequestValidationError(
+            f"Unknown filters: {', '.join(sorted(unknown))}. "
+            f"Supported filters are: {', '.join(FILTER_FIELDS)}."
+        )
+    for field, value in filters.items():
+        if not isinstance(value, str):
+            raise RequestValidationError(f"The '{field}' filter must be a string.")
+    for field in DATE_FILTER_FIELDS:
+        if filters.get(field):
+            try:
+                if not DATE_FILTER_PATTERN.fullmatch(filters[field]):
+                    raise ValueError
+                date.fromisoformat(filters[field])
+            except ValueError:
+                raise RequestValidationError(
+                    f"The '{field}' filter must be a date in YYYY-MM-DD format."
+                )
+
 
 def validate_huberman_request(data):
     """
@@ -22,10 +79,90 @@ def validate_huberman_request(data):
         raise RequestValidationError("Request must contain a 'message' field.")
     if not isinstance(data["message"], str):
         raise RequestValidationError("The 'message' field must be a string.")
-    if "history" not in data:
-        raise RequestValidationError("Request must contain a 'history' field.")
-    if not isinstance(data["history"], list):
+    if "session_id" in data:
+        if not isinstance(data["session_id"], str):
+            raise RequestValidationError("The 'session_id' field must be a string.")
+    elif "history" not in data:
+        raise RequestValidationError(
+            "Request must contain a 'history' or a 'session_id' field."
+        )
+    if "history" in data and not isinstance(data["history"], list):
         raise RequestValidationError("The 'history' field must be a list.")
+    if "filters" in data:
+        validate_filters(data["filters"])
+
+
+def validate_recommendation_request(data):
+    """
+    Validates the request payload for the /recommend_episodes endpoint.
+
+    Parameters:
+    - data (dict): The JSON payload of the request.
+
+    Raises:
+    - RequestValidationError: If the validation checks fail.
+    """
+    if not data or "message" not in data:
+        raise RequestValidationError("Request must contain a 'message' field.")
+    if not isinstance(data["message"], str):
+        raise RequestValidationError("The 'message' field must be a string.")
+    count = data.get("count", DEFAULT_RECOMMENDATIONS)
+    if not isinstance(count, int) or not 1 <= count <= MAX_RECOMMENDATIONS:
+        raise RequestValidationError(
+            f"The 'count' field must be an integer between 1 and {MAX_RECOMMENDATIONS}."
+        )
+    if "filters" in data:
+        validate_filters(data["filters"])
+
+
+def parse_batch_request(lines):
+    """
+    Parses and validates the JSONL payload of a batch of questions.
+
+    Each line holds a JSON object with a 'message' and optional 'id' (a string or an integer), 'history' and
+    'filters' fields.
+    Questions without an 'id' are identified by their line number.
+
+    Parameters:
+    - lines (list): The lines of the payload.
+
+    Returns:
+    - list: The questions, with 'id' and 'history' filled in.
+
+    Raises:
+    - RequestValidationError: If any line fails the validation checks.
+    """
+    questions = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            question = json.loads(line)
+        except json.JSONDecodeError:
+            raise RequestValidationError(f"Line {line_number} is not valid JSON.")
+        if not isinstance(question, dict):
+            raise RequestValidationError(f"Line {line_number} must be a JSON object.")
+        try:
+            validate_huberman_request({"history": [], **question})
+            if "session_id" in question:
+                raise RequestValidationError("Sessions are not supported in batches.")
+            # Ids must be hashable for resuming a batch from its output file
+            if "id" in question and (
+                not isinstance(question["id"], (str, int))
+                or isinstance(question["id"], bool)
+            ):
+                raise RequestValidationError(
+                    "The 'id' field must be a string or an integer."
+                )
+        except RequestValidationError as error:
+            raise RequestValidationError(f"Line {line_number}: {error.message}")
+        questions.append({"id": line_number, "history": [], **question})
+    if not questions:
+        raise RequestValidationError("The batch must contain at least one question.")
+    ids = [question["id"] for question in questions]
+    if len(set(map(json.dumps, ids))) != len(ids):
+        raise RequestValidationError("Question ids must be unique within a batch.")
+    return questions
 
 
 @app.errorhandler(404)
@@ -53,12 +190,58 @@ def handle_openai_error(error):
     return jsonify({"meta": {}, "errors": {"message": str(error)}}), 500
 
 
+@app.errorhandler(OverloadedError)
+def handle_overloaded_error(error):
+    """Handles requests shed because the OpenAI API cannot serve them in time."""
+    response = jsonify({"meta": {}, "errors": {"message": str(error)}})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
 @app.errorhandler(RequestValidationError)
 def handle_request_validation_error(error):
     """Handles request validation errors for the API."""
     return jsonify({"meta": {}, "errors": {"message": error.message}}), 400
 
 
+@app.before_request
+def start_request_deadline():
+    """Gives every request a deadline for getting its OpenAI calls admitted."""
+    upstream.set_deadline(Config.REQUEST_DEADLINE_SECONDS)
+
+
+@app.teardown_request
+def clear_request_deadline(error):
+    upstream.clear_deadline()
+
+
+@app.before_request
+def start_profile():
+    """Profiles the request when it is sampled or carries a valid profiling token."""
+    if profiling.requested(request.headers):
+        g.profile = profiling.start(f"{request.method} {request.path}")
+
+
+@app.after_request
+def finish_profile(response):
+    """Writes the request's trace, if any, and names it in the X-Profile-Trace header."""
+    profile = g.pop("profile", None)
+    if profile is not None:
+        trace = profile.finish()
+        if trace is not None:
+            response.headers["X-Profile-Trace"] = trace
+    return response
+
+
+@app.teardown_request
+def stop_profile(error):
+    # after_request is skipped if the request fails before a response is made
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.finish()
+
+
 @app.route("/test_error")
 def test_error():
     raise ProcessingError("This is a test processing error.")
@@ -79,6 +262,35 @@ def health_check():
         return jsonify({"meta": {"ok": False}}), 500
 
 
+@app.route("/live", methods=["GET"])
+def live():
+    """
+    A liveness endpoint that answers as soon as the application is serving, without touching any dependency.
+
+    Returns:
+    - A JSON response indicating the process is alive.
+    """
+    return jsonify({"meta": {"ok": True}}), 200
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    A readiness endpoint reporting whether the indexes and database are loaded and requests can be served
+    without a cold-start delay. Starts loading them if that has not happened yet.
+
+    Returns:
+    - A JSON response indicating the readiness status.
+    """
+    if engine.is_ready():
+        return jsonify({"meta": {"ok": True}}), 200
+    engine.warm_up()
+    meta = {"ok": False}
+    if engine.warm_up_error is not None:
+        meta["error"] = str(engine.warm_up_error)
+    return jsonify({"meta": meta}), 503
+
+
 @app.route("/ask_huberman", methods=["POST"])
 def ask_huberman():
     """
@@ -92,10 +304,92 @@ def ask_huberman():
 
     message = data["message"]
     print("message: ", message)
-    history = data["history"]
-    response_data = engine.get_humberman_response(message, history)
+    history = data.get("history", [])
+    filters = data.get("filters")
+    meta = {}
+    session = None
+    if "session_id" in data:
+        session = sessions.store.get(data["session_id"])
+        if session is None:
+            raise RequestValidationError("Unknown or expired session.")
+        meta["session_id"] = session.id
+    response_data = engine.get_humberman_response(message, history, filters, session)
+
+    return jsonify({"meta": meta, "data": response_data}), 200
+
+
+@app.route("/sessions", methods=["POST"])
+def create_session():
+    """
+    Starts a server-side conversation. Pass the returned session_id to /ask_huberman instead of the history.
+
+    Returns:
+    - A JSON response containing the new session id.
+    """
+    session = sessions.store.create()
+    return jsonify({"meta": {}, "data": {"session_id": session.id}}), 201
+
+
+@app.route("/answers/<token>", methods=["GET"])
+def get_answer(token):
+    """
+    Fetches the answer of an /ask_huberman request that returned before its completion finished.
+
+    Returns:
+    - A JSON response containing the OpenAI response and its answer_status.
+    """
+    answer = engine.get_pending_answer(token)
+    if answer is None:
+        return (
+            jsonify({"meta": {}, "errors": {"message": "Unknown or expired token."}}),
+            404,
+        )
+    return jsonify({"meta": {}, "data": answer}), 200
+
+
+@app.route("/recommend_episodes", methods=["POST"])
+def recommend_episodes():
+    """
+    Recommends the podcast episodes most related to a message.
+
+    Returns:
+    - A JSON response containing the recommended episodes, best first.
+    """
+    data = request.json
+    validate_recommendation_request(data)
+
+    recommendations = engine.get_episode_recommendations(
+        data["message"],
+        data.get("count", DEFAULT_RECOMMENDATIONS),
+        data.get("filters"),
+    )
+
+    return jsonify({"meta": {}, "data": recommendations}), 200
+
+
+@app.route("/ask_huberman_batch", methods=["POST"])
+def ask_huberman_batch():
+    """
+    Answers a batch of questions sent as JSONL, one question per line.
+
+    Returns:
+    - A JSONL response streaming one result per question, in completion order.
+    """
+    questions = parse_batch_request(request.get_data(as_text=True).splitlines())
+    if len(questions) > Config.MAX_BATCH_SIZE:
+        raise RequestValidationError(
+            f"A batch can contain at most {Config.MAX_BATCH_SIZE} questions."
+        )
 
-    return jsonify({"meta": {}, "data": response_data}), 200
+    # Batches are throttled by their own share of the completion slots rather than the request deadline
+    upstream.set_deadline(None)
+    results = batch.answer_questions(
+        questions, admission=engine.batch_completion_admission
+    )
+    return Response(
+        stream_with_context(json.dumps(result) + "\n" for result in results),
+        mimetype="application/x-ndjson",
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+"""
+batch.py
+
+Answers many questions in one pass, for offline and bulk workloads. All questions are embedded in bulk, those
+sharing the same filters are searched with a single matrix query, then completions are issued with bounded
+concurrency and each result is yielded as soon as it finishes.
+
+The module backs the /ask_huberman_batch endpoint and can also be run as a command line tool that reads
+questions from a JSONL file and appends results to a JSONL output file:
+
+    python batch.py questions.jsonl answers.jsonl --concurrency 8
+
+Questions already answered in the output file are skipped, so an interrupted run can be resumed by running
+the same command again.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from flask import current_app
+
+import engine
+from config import Config
+from errors import (
+    OpenAIError,
+    OverloadedError,
+    ProcessingError,
+    RequestValidationError,
+)
+
+
+def _error_result(question_id, error):
+    """Builds the result line for a question that could not be answered."""
+    return {"id": question_id, "errors": {"message": str(error)}}
+
+
+def answer_questions(questions, max_workers=Config.BATCH_CONCURRENCY, admission=None):
+    """
+    Answers many questions, yielding each result as soon as its completion finishes.
+
+    Must be called within a Flask application context.
+
+    Parameters:
+    - questions (list): Validated dictionaries with "id", "message", "history" and optional "filters" keys.
+    - max_workers (int): The maximum number of completion requests in flight.
+    - admission (AdmissionController, optional): Limits the completions of all batches together, so
+      that batches served alongside interactive requests cannot take every completion slot.
+
+    Yields:
+    - dict: {"id": ..., "data": {...}} for an answered question, or {"id": ..., "errors": {...}} otherwise.
+    """
+    if not questions:
+        return
+    app = current_app._get_current_object()
+
+    def answer(question, context_df):
+        with app.app_context():
+            try:
+                with admission.slot() if admission else nullcontext():
+                    data = engine.answer_with_context(
+                        question["message"], question["history"], context_df
+                    )
+                return {"id": question["id"], "data": data}
+            except (OpenAIError, OverloadedError, ProcessingError) as e:
+                return _error_result(question["id"], e)
+
+    try:
+        query_embeddings = engine.embed_questions(
+            [question["message"] for question in questions]
+        )
+    except (OverloadedError, ProcessingError) as e:
+        for question in questions:
+            yield _error_result(question["id"], e)
+        return
+
+    groups = {}
+    for position, question in enumerate(questions):
+        key = json.dumps(question.get("filters") or {}, sort_keys=True)
+        groups.setdefault(key, []).append(position)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = set()
+        for positions in groups.values():
+            group = [questions[position] for position in positions]
+            try:
+                context_dfs = engine.get_context_responses(
+                    query_embeddings[positions], group[0].get("filters")
+                )
+            except (RequestValidationError, OverloadedError, ProcessingError) as e:
+                for question in group:
+                    yield _error_result(question["id"], e)
+                continue
+            futures.update(
+                executor.submit(answer, question, context_df)
+                for question, context_df in zip(group, context_dfs)
+            )
+            # Stream the answers finished so far while later groups are searched
+            done = {future for future in futures if future.done()}
+            futures -= done
+            for future in done:
+                yield future.result()
+
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Stop issuing completions if the consumer goes away mid-batch
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_checkpoint(output_path):
+    """
+    Reads the ids of the questions already answered in an output file.
+
+    Parameters:
+    - output_path (str): The JSONL output file of a previous run.
+
+    Returns:
+    - set: The ids of successfully answered questions. Failed questions are retried.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    answered = set()
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A run interrupted mid-write leaves a truncated last line
+                continue
+            if "data" in result:
+                answered.add(result["id"])
+    return answered
+
+
+def truncate_partial_line(output_path):
+    """
+    Removes the truncated last line an interrupted run may have left, so that appended results start on a
+    line of their own.
+
+    Parameters:
+    - output_path (str): The JSONL output file of a previous run.
+    """
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        # Scan backwards for the end of the last complete line
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of questions and append JSONL results."
+    )
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=Config.BATCH_CONCURRENCY,
+        help="maximum number of completion requests in flight",
+    )
+    args = parser.parse_args()
+
+    from app import app, parse_batch_request
+
+    # A standalone run has no interactive requests to leave completion slots for
+    engine.completion_admission.max_concurrent = max(
+        engine.completion_admission.max_concurrent, args.concurrency
+    )
+
+    with open(args.input, "r") as f:
+        questions = parse_batch_request(f.read().splitlines())
+    truncate_partial_line(args.output)
+    answered = read_checkpoint(args.output)
+    pending = [question for question in questions if question["id"] not in answered]
+    print(f"{len(answered)} questions already answered, {len(pending)} to go.")
+
+    with app.app_context(), open(args.output, "a") as output:
+        for result in answer_questions(pending, args.concurrency):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+
+if __name__ == "__main__":
+    main()
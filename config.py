@@ -11,6 +11,86 @@ class Config(object):
     FAISS_INDEX_PATH = os.environ.get(
         "FAISS_INDEX_PATH", "data/processed/faiss_index.index"
     )
+    EPISODES_PATH = os.environ.get("EPISODES_PATH", "data/processed/episodes.csv")
+    EPISODE_INDEX_PATH = os.environ.get(
+        "EPISODE_INDEX_PATH", "data/processed/episode_index.index"
+    )
+    # Search a PCA-reduced index first, then re-rank its RERANK_CANDIDATES best chunks exactly
+    # against the full vectors, memory-mapped from CHUNK_VECTORS_PATH
+    REDUCED_DIM_SEARCH = os.environ.get("REDUCED_DIM_SEARCH", "false") == "true"
+    REDUCED_INDEX_PATH = os.environ.get(
+        "REDUCED_INDEX_PATH", "data/processed/faiss_index_reduced.index"
+    )
+    CHUNK_VECTORS_PATH = os.environ.get(
+        "CHUNK_VECTORS_PATH", "data/processed/chunk_vectors.npy"
+    )
+    RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "50"))
+    # Split searches across shard worker processes, see shards.py. Set SPAWN_SHARD_WORKERS=false
+    # when the workers are run separately
+    SHARDED_SEARCH = os.environ.get("SHARDED_SEARCH", "false") == "true"
+    SPAWN_SHARD_WORKERS = os.environ.get("SPAWN_SHARD_WORKERS", "true") == "true"
+    SHARDS_DIR = os.environ.get("SHARDS_DIR", "data/processed/shards")
+    SHARD_SOCKET_DIR = os.environ.get("SHARD_SOCKET_DIR", "/tmp/huberman-shards")
+    SHARD_STARTUP_TIMEOUT_SECONDS = float(
+        os.environ.get("SHARD_STARTUP_TIMEOUT_SECONDS", "60")
+    )
+    # Search only the chunks of the COARSE_EPISODES episodes closest to the question
+    HIERARCHICAL_SEARCH = os.environ.get("HIERARCHICAL_SEARCH", "false") == "true"
+    COARSE_EPISODES = int(os.environ.get("COARSE_EPISODES", "8"))
+    # Concurrent completion requests per batch, and the largest batch accepted over HTTP
+    BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+    MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "5000"))
+    # The share of OpenAI completion slots and rate that batches may use, so interactive requests always
+    # have slots left
+    BATCH_COMPLETION_CONCURRENCY = int(
+        os.environ.get("BATCH_COMPLETION_CONCURRENCY", "4")
+    )
+    BATCH_COMPLETION_RATE = float(os.environ.get("BATCH_COMPLETION_RATE", "5"))
+
+    # "background" loads indexes and the database in a warm-up thread at startup, "lazy" on the
+    # first request or readiness probe, and "eager" before the application starts serving
+    STARTUP_MODE = os.environ.get("STARTUP_MODE", "background")
+
+    # Requests that cannot get an OpenAI slot within REQUEST_DEADLINE_SECONDS are rejected with 503
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "20"))
+    OPENAI_COMPLETION_CONCURRENCY = int(
+        os.environ.get("OPENAI_COMPLETION_CONCURRENCY", "8")
+    )
+    OPENAI_COMPLETION_RATE = float(os.environ.get("OPENAI_COMPLETION_RATE", "10"))
+    OPENAI_EMBEDDING_CONCURRENCY = int(
+        os.environ.get("OPENAI_EMBEDDING_CONCURRENCY", "16")
+    )
+    OPENAI_EMBEDDING_RATE = float(os.environ.get("OPENAI_EMBEDDING_RATE", "50"))
+    OPENAI_MAX_WAITING = int(os.environ.get("OPENAI_MAX_WAITING", "32"))
+    OPENAI_MAX_BACKOFF_SECONDS = int(os.environ.get("OPENAI_MAX_BACKOFF_SECONDS", "4"))
+
+    # In degraded mode, /ask_huberman returns the context alone when the completion overruns
+    # ANSWER_BUDGET_SECONDS, fails, or the circuit breaker on OpenAI is open
+    DEGRADED_MODE = os.environ.get("DEGRADED_MODE", "true") == "true"
+    ANSWER_BUDGET_SECONDS = float(os.environ.get("ANSWER_BUDGET_SECONDS", "10"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+    PENDING_ANSWER_TTL_SECONDS = float(
+        os.environ.get("PENDING_ANSWER_TTL_SECONDS", "300")
+    )
+    MAX_PENDING_ANSWERS = int(os.environ.get("MAX_PENDING_ANSWERS", "1000"))
+
+    # Server-side conversation sessions, see sessions.py
+    MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "10000"))
+    SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+    SESSION_RECENT_MESSAGES = int(os.environ.get("SESSION_RECENT_MESSAGES", "6"))
+    # Follow-ups at least this similar to the last searched question reuse its results
+    SESSION_REUSE_SIMILARITY = float(os.environ.get("SESSION_REUSE_SIMILARITY", "0.9"))
+    SESSION_SUMMARY_WEIGHT = float(os.environ.get("SESSION_SUMMARY_WEIGHT", "0.3"))
+
+    # On-demand request profiling, see profiling.py. Requests are profiled at PROFILE_SAMPLE_RATE, or when
+    # their X-Profile-Token header matches PROFILE_TOKEN; both are off by default
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+    PROFILE_MODE = os.environ.get("PROFILE_MODE", "sample")
+    PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/huberman-profiles")
+    PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "100"))
 
     CORS_ALLOWED_ORIGINS = [
         "https://huberman-gpt-gamma.vercel.app",
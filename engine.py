@@ -5,6 +5,10 @@ This module provides core functionalities for the Flask application, including i
 FAISS index querying, and utility functions for processing and formatting data. It is designed to support the
 application's needs for fetching embeddings, generating responses based on context, and formatting data for output.
 
+Heavy dependencies are imported and resources (database engine, FAISS indexes, episode metadata) are loaded
+on first use rather than at import time, so the application can start and answer liveness probes immediately.
+warm_up() loads them in a background thread and is_ready() reports when it has finished.
+
 Dependencies:
 - Flask for the web application framework.
 - Pandas for data manipulation.
@@ -12,31 +16,243 @@ Dependencies:
 - OpenAI for accessing the OpenAI API.
 - NumPy for numerical operations.
 - FAISS for efficient similarity search in large datasets.
-- Python standard libraries: os, re, backoff for retrying operations.
+- Python standard libraries: os, re, threading, backoff for retrying operations.
 """
 
 from flask import current_app
 
 
 from config import Config
-import pandas as pd
-from sqlalchemy import create_engine
-import openai
-import numpy as np
-import faiss
+import os
 import re
+import threading
+import time
+import uuid
 import backoff
-from errors import ProcessingError, OpenAIError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from types import SimpleNamespace
+from errors import (
+    ProcessingError,
+    OpenAIError,
+    OverloadedError,
+    RequestValidationError,
+)
+import shards
+import upstream
+
+CONTEXT_RESULTS = 5
+EMBEDDING_BATCH_SIZE = 500
+
+embedding_admission = upstream.AdmissionController(
+    "OpenAI embedding",
+    Config.OPENAI_EMBEDDING_CONCURRENCY,
+    Config.OPENAI_EMBEDDING_RATE,
+    Config.OPENAI_MAX_WAITING,
+)
+completion_admission = upstream.AdmissionController(
+    "OpenAI completion",
+    Config.OPENAI_COMPLETION_CONCURRENCY,
+    Config.OPENAI_COMPLETION_RATE,
+    Config.OPENAI_MAX_WAITING,
+)
+# Taken before a completion_admission slot by questions of /ask_huberman_batch. Batches have no deadline and
+# would otherwise hold every completion slot for as long as they run
+batch_completion_admission = upstream.AdmissionController(
+    "OpenAI batch completion",
+    max(
+        1,
+        min(
+            Config.BATCH_COMPLETION_CONCURRENCY,
+            Config.OPENAI_COMPLETION_CONCURRENCY - 1,
+        ),
+    ),
+    Config.BATCH_COMPLETION_RATE,
+    Config.OPENAI_MAX_WAITING,
+)
+completion_breaker = upstream.CircuitBreaker(
+    Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS
+)
+
+ANSWER_COMPLETE = "complete"
+ANSWER_PENDING = "pending"
+ANSWER_UNAVAILABLE = "unavailable"
+
+# Completions that overrun the answer budget keep running here so their answer can be fetched later.
+# Tasks are only submitted while a worker is free (see _submit_completion_task), so none wait in the
+# executor's unbounded queue out of sight of admission control.
+_COMPLETION_WORKERS = Config.OPENAI_COMPLETION_CONCURRENCY + Config.OPENAI_MAX_WAITING
+_completion_executor = ThreadPoolExecutor(
+    max_workers=_COMPLETION_WORKERS, thread_name_prefix="completion"
+)
+_completion_workers = threading.BoundedSemaphore(_COMPLETION_WORKERS)
+_pending_answers = OrderedDict()
+_pending_answers_lock = threading.Lock()
+
+_resources = None
+_resources_lock = threading.Lock()
+# Separate from _resources_lock, which is held for the whole load, so warm_up() never waits for it
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+warm_up_error = None
+
+
+def _load_resources():
+    """
+    Imports the heavy dependencies and loads the database engine, FAISS indexes and episode metadata.
+
+    Returns:
+    - SimpleNamespace: The loaded resources.
+    """
+    import faiss
+    import numpy as np
+    import pandas as pd
+    from sqlalchemy import create_engine
+
+    reduced = Config.REDUCED_DIM_SEARCH and os.path.exists(Config.REDUCED_INDEX_PATH)
+    sharded_searcher = None
+    manifest = shards.read_manifest() if Config.SHARDED_SEARCH else None
+    if manifest is not None:
+        # Searches go to the shard workers; full vectors are only needed for hierarchical search
+        reduced = False
+        index = None
+        sharded_searcher = shards.ShardedSearcher(
+            manifest["num_shards"], Config.SPAWN_SHARD_WORKERS
+        )
+        chunk_vectors = (
+            np.load(Config.CHUNK_VECTORS_PATH, mmap_mode="r")
+            if os.path.exists(Config.CHUNK_VECTORS_PATH)
+            else None
+        )
+    elif reduced:
+        index = faiss.read_index(Config.REDUCED_INDEX_PATH)
+        # Full vectors for re-ranking stay on disk; only candidate rows are paged in
+        chunk_vectors = np.load(Config.CHUNK_VECTORS_PATH, mmap_mode="r")
+    else:
+        index = faiss.read_index(Config.FAISS_INDEX_PATH)
+        # Zero-copy view of the flat index's vectors, row i being chunk i
+        chunk_vectors = faiss.rev_swig_ptr(
+            index.get_xb(), index.ntotal * index.d
+        ).reshape(index.ntotal, index.d)
+    episodes = (
+        pd.read_csv(Config.EPISODES_PATH, keep_default_na=False)
+        if os.path.exists(Config.EPISODES_PATH)
+        else None
+    )
+    episode_index = (
+        faiss.read_index(Config.EPISODE_INDEX_PATH)
+        if episodes is not None and os.path.exists(Config.EPISODE_INDEX_PATH)
+        else None
+    )
+    return SimpleNamespace(
+        engine=create_engine(Config.DATABASE_URI),
+        index=index,
+        reduced=reduced,
+        shards=sharded_searcher,
+        episodes=episodes,
+        episode_index=episode_index,
+        chunk_vectors=chunk_vectors,
+    )
+
+
+def get_resources():
+    """
+    Returns the shared resources, loading them on first use. Concurrent callers wait for a single load.
+
+    Returns:
+    - SimpleNamespace: The database engine, FAISS indexes and episode metadata.
+    """
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = _load_resources()
+    return _resources
+
+
+def _warm_up():
+    """Loads the resources and the OpenAI client, recording any failure for the readiness check."""
+    global warm_up_error
+    try:
+        get_resources()
+        _openai()
+        warm_up_error = None
+    except Exception as e:
+        warm_up_error = e
+
+
+def warm_up():
+    """
+    Starts loading the resources in a background thread, unless already loading or loaded. Returns at once,
+    even while another thread is loading them.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _resources is not None or (
+            _warm_up_thread is not None and _warm_up_thread.is_alive()
+        ):
+            return
+        _warm_up_thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+        _warm_up_thread.start()
+
+
+def is_ready():
+    """Returns True once the resources have been loaded."""
+    return _resources is not None
+
+
+def _openai():
+    """Returns the openai module, importing and configuring it on first use."""
+    import openai
+
+    openai.api_key = Config.OPENAI_API_KEY
+    return openai
 
-# Initialize external services with configurations
-openai.api_key = Config.OPENAI_API_KEY
-engine = create_engine(Config.DATABASE_URI)
-index = faiss.read_index("data/processed/faiss_index.index")
+
+def _admitted_call(admission, create, **kwargs):
+    """Makes a single OpenAI API call once admission grants it a slot before the request deadline."""
+    with admission.slot(upstream.current_deadline()):
+        return create(**kwargs)
+
+
+def _call_openai(admission, create, **kwargs):
+    """
+    Calls an OpenAI API method through an admission controller, retrying rate limits with exponential
+    backoff until the request deadline. Every attempt takes its own slot, so backing off does not hold one.
+
+    Parameters:
+    - admission (AdmissionController): The controller limiting calls to this API.
+    - create (callable): The OpenAI API method to call.
+    - kwargs: The arguments of the call.
+
+    Returns:
+    - The OpenAI API response.
+
+    Raises:
+    - OverloadedError: If the call cannot be admitted, or is still rate limited, before the deadline.
+    """
+    openai = _openai()
+    retrying_call = backoff.on_exception(
+        backoff.expo,
+        openai.error.RateLimitError,
+        max_tries=6,
+        max_time=upstream.remaining_time(),
+        max_value=Config.OPENAI_MAX_BACKOFF_SECONDS,
+    )(_admitted_call)
+    try:
+        return retrying_call(admission, create, **kwargs)
+    except openai.error.RateLimitError as error:
+        current_app.logger.warning(f"OpenAI rate limit persisted: {error}")
+        raise OverloadedError(
+            "The OpenAI API is rate limiting requests. Please retry later.",
+            retry_after=Config.OPENAI_MAX_BACKOFF_SECONDS,
+        )
 
 
 def openai_health_check():
     """Raises an exception if OpenAI API isn't available"""
-    openai.Model.list()
+    _openai().Model.list()
 
 
 def get_embeddings(line):
@@ -49,28 +265,358 @@ def get_embeddings(line):
     Returns:
     - list: The embedding vector for the given line of text.
     """
-    return openai.Embedding.create(input=[line], model="text-embedding-ada-002")[
-        "data"
-    ][0]["embedding"]
+    return _call_openai(
+        embedding_admission,
+        _openai().Embedding.create,
+        input=[line],
+        model="text-embedding-ada-002",
+    )["data"][0]["embedding"]
+
+
+def select_episodes(filters):
+    """
+    Selects the episodes matching the given metadata filters.
+
+    Parameters:
+    - filters (dict): Any of "episode" (exact sanitized title), "guest" (case-insensitive part of the
+      sanitized title, e.g. "GUEST-SERIES-Dr-Andy-Galpin"), "published_after" and "published_before"
+      (inclusive ISO dates).
+
+    Returns:
+    - DataFrame: The rows of the episode metadata table matching every filter.
+    """
+    episodes = get_resources().episodes
+    if episodes is None:
+        raise ProcessingError(
+            "Episode metadata is unavailable; rebuild the index to enable filters."
+        )
+    selected = episodes
+    if filters.get("episode"):
+        selected = selected[selected["sanitized_title"] == filters["episode"]]
+    if filters.get("guest"):
+        selected = selected[
+            selected["sanitized_title"].str.contains(
+                filters["guest"], case=False, regex=False
+            )
+        ]
+    if filters.get("published_after"):
+        selected = selected[selected["published"] >= filters["published_after"]]
+    if filters.get("published_before"):
+        selected = selected[selected["published"] <= filters["published_before"]]
+    return selected
+
+
+def _filter_key(filters):
+    """Returns a hashable key for a filters dict, ignoring empty values."""
+    return tuple(sorted((key, value) for key, value in filters.items() if value))
+
+
+@lru_cache(maxsize=256)
+def _get_filter_ranges(filter_key):
+    """
+    Returns the chunk id ranges of the filtered episodes. Cached per filter combination.
+
+    Parameters:
+    - filter_key (tuple): The filters, as returned by _filter_key.
+
+    Returns:
+    - tuple: (start_id, end_id) tuples, one per selected episode.
+    """
+    selected = select_episodes(dict(filter_key))
+    if selected.empty:
+        raise RequestValidationError("No episodes match the given filters.")
+    return tuple(
+        (int(start_id), int(end_id))
+        for start_id, end_id in zip(selected["start_id"], selected["end_id"])
+    )
+
+
+@lru_cache(maxsize=256)
+def _get_search_parameters(filter_key):
+    """
+    Builds FAISS search parameters that restrict the search to the chunks of the filtered episodes,
+    so only the selected chunks are scored. Cached per filter combination.
+
+    Parameters:
+    - filter_key (tuple): The filters, as returned by _filter_key.
+
+    Returns:
+    - tuple: The SearchParameters, followed by the objects it references, which must be kept alive.
+    """
+    import faiss
+    import numpy as np
+
+    resources = get_resources()
+    ranges = _get_filter_ranges(filter_key)
+    if len(ranges) == 1:
+        # Episodes are stored contiguously, so a single episode is a plain id range.
+        selector = faiss.IDSelectorRange(*ranges[0])
+        references = (selector,)
+    else:
+        mask = np.zeros(resources.index.ntotal, dtype=bool)
+        for start_id, end_id in ranges:
+            mask[start_id:end_id] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(bitmap)
+        references = (selector, bitmap)
+
+    params = faiss.SearchParameters(sel=selector)
+    if resources.reduced:
+        # The selector applies to the flat index behind the PCA transform
+        return (
+            faiss.SearchParametersPreTransform(index_params=params),
+            params,
+        ) + references
+    return (params,) + references
+
+
+def _embed_question(question):
+    """Returns the L2-normalized embedding of a question as a (1, d) float32 array."""
+    import faiss
+    import numpy as np
+
+    query_embedding = (
+        np.array(get_embeddings(question)).astype("float32").reshape(1, -1)
+    )
+    faiss.normalize_L2(query_embedding)
+    return query_embedding
+
+
+def search_episodes(query_embedding, count, filters=None):
+    """
+    Finds the episodes closest to a query using the coarse index of per-episode centroids.
+
+    Parameters:
+    - query_embedding (ndarray): The normalized (1, d) query embedding.
+    - count (int): The number of episodes to return.
+    - filters (dict, optional): Metadata filters restricting the episodes, see select_episodes.
+
+    Returns:
+    - DataFrame: The matching rows of the episode metadata table with a "score" column, best first.
+    """
+    import faiss
+
+    resources = get_resources()
+    search_kwargs = {}
+    if filters:
+        selected = select_episodes(filters)
+        if selected.empty:
+            raise RequestValidationError("No episodes match the given filters.")
+        selector = faiss.IDSelectorBatch(selected["episode_id"].to_numpy())
+        search_kwargs["params"] = faiss.SearchParameters(sel=selector)
+
+    scores, episode_ids = resources.episode_index.search(
+        query_embedding, count, **search_kwargs
+    )
+    found = episode_ids[0] >= 0
+    # Rows of the episode table are ordered by episode_id
+    recommended = resources.episodes.iloc[episode_ids[0][found]].copy()
+    recommended["score"] = scores[0][found]
+    return recommended
+
+
+def _search_episode_chunks(query_embedding, selected):
+    """
+    Scores only the chunks of the given episodes. Each episode's chunks are a contiguous slice of the
+    flat index, which serves as that episode's sub-index.
+
+    Parameters:
+    - query_embedding (ndarray): The normalized (1, d) query embedding.
+    - selected (DataFrame): Rows of the episode metadata table to search.
+
+    Returns:
+    - ndarray: The ids of the closest chunks, best first.
+    """
+    import numpy as np
+
+    chunk_vectors = get_resources().chunk_vectors
+    ranges = list(zip(selected["start_id"], selected["end_id"]))
+    ids = np.concatenate([np.arange(start_id, end_id) for start_id, end_id in ranges])
+    scores = np.concatenate(
+        [
+            chunk_vectors[start_id:end_id] @ query_embedding[0]
+            for start_id, end_id in ranges
+        ]
+    )
+    return ids[np.argsort(-scores)[:CONTEXT_RESULTS]]
+
+
+def _search_chunks(query_embeddings, filters=None):
+    """
+    Finds the chunks closest to each query, either in two stages (episodes, then their chunks) when
+    hierarchical search is enabled, or with a single matrix search over the whole flat index.
+
+    Parameters:
+    - query_embeddings (ndarray): The normalized (n, d) query embeddings.
+    - filters (dict, optional): Metadata filters restricting the search, see select_episodes.
+
+    Returns:
+    - list: One array of chunk ids per query, best first.
+    """
+    import numpy as np
+
+    resources = get_resources()
+    if (
+        Config.HIERARCHICAL_SEARCH
+        and resources.episode_index is not None
+        and resources.chunk_vectors is not None
+    ):
+        return [
+            _search_episode_chunks(
+                query_embedding,
+                search_episodes(query_embedding, Config.COARSE_EPISODES, filters),
+            )
+            for query_embedding in np.split(query_embeddings, len(query_embeddings))
+        ]
+
+    if resources.shards is not None:
+        ranges = _get_filter_ranges(_filter_key(filters)) if filters else None
+        distances, indices = resources.shards.search(
+            query_embeddings, CONTEXT_RESULTS, ranges
+        )
+        return [row[row >= 0] for row in indices]
+
+    search_kwargs = {}
+    if filters:
+        search_kwargs["params"] = _get_search_parameters(_filter_key(filters))[0]
+    candidates = Config.RERANK_CANDIDATES if resources.reduced else CONTEXT_RESULTS
+    distances, indices = resources.index.search(
+        query_embeddings, candidates, **search_kwargs
+    )
+    # FAISS pads the results with -1 when fewer chunks than requested are selected.
+    chunk_ids = [row[row >= 0] for row in indices]
+    if resources.reduced:
+        chunk_ids = [
+            _rerank(query_embedding, ids, resources.chunk_vectors)
+            for query_embedding, ids in zip(query_embeddings, chunk_ids)
+        ]
+    return chunk_ids
+
+
+def _rerank(query_embedding, candidate_ids, chunk_vectors):
+    """
+    Re-scores first-pass candidates exactly against their full vectors.
+
+    Parameters:
+    - query_embedding (ndarray): The normalized (d,) query embedding.
+    - candidate_ids (ndarray): The chunk ids found by the first pass.
+    - chunk_vectors (ndarray): The full chunk vectors, usually memory-mapped.
+
+    Returns:
+    - ndarray: The CONTEXT_RESULTS best chunk ids, best first.
+    """
+    import numpy as np
+
+    # Reading rows in id order keeps memory-mapped reads sequential
+    candidate_ids = np.sort(candidate_ids)
+    scores = chunk_vectors[candidate_ids] @ query_embedding
+    return candidate_ids[np.argsort(-scores)[:CONTEXT_RESULTS]]
+
+
+def get_embeddings_batch(lines):
+    """
+    Fetches embeddings for many lines of text, sending up to EMBEDDING_BATCH_SIZE lines per OpenAI API call.
+
+    Parameters:
+    - lines (list): The text lines for which embeddings are to be fetched.
+
+    Returns:
+    - list: The embedding vectors, in the order of the given lines.
+    """
+    openai = _openai()
+    embeddings = []
+    for start in range(0, len(lines), EMBEDDING_BATCH_SIZE):
+        response = _call_openai(
+            embedding_admission,
+            openai.Embedding.create,
+            input=lines[start : start + EMBEDDING_BATCH_SIZE],
+            model="text-embedding-ada-002",
+        )
+        embeddings.extend(
+            item["embedding"]
+            for item in sorted(response["data"], key=lambda item: item["index"])
+        )
+    return embeddings
+
+
+def embed_questions(questions):
+    """
+    Embeds many questions in bulk, see get_embeddings_batch.
+
+    Parameters:
+    - questions (list): The questions to embed.
+
+    Returns:
+    - ndarray: The L2-normalized (n, d) float32 embeddings, in the order of the questions.
+    """
+    import faiss
+    import numpy as np
+
+    try:
+        query_embeddings = np.array(get_embeddings_batch(questions), dtype="float32")
+        faiss.normalize_L2(query_embeddings)
+        return query_embeddings
+    except OverloadedError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error in embed_questions: {e}")
+        raise ProcessingError(
+            f"Error occurred while embedding questions: {e}", e.__class__.__name__
+        )
+
+
+def get_context_responses(query_embeddings, filters=None):
+    """
+    Retrieves relevant context for many embedded questions at once, searching the FAISS index with a
+    single matrix query.
+
+    Parameters:
+    - query_embeddings (ndarray): The normalized (n, d) question embeddings, see embed_questions.
+    - filters (dict, optional): Metadata filters applied to every question, see select_episodes.
+
+    Returns:
+    - list: One pandas DataFrame of relevant context per question.
+    """
+    import pandas as pd
+
+    try:
+        docs = pd.read_sql_table("docs", get_resources().engine)
+        return [
+            docs.iloc[chunk_ids]
+            for chunk_ids in _search_chunks(query_embeddings, filters)
+        ]
+    except (RequestValidationError, ProcessingError, OverloadedError):
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error in get_context_responses: {e}")
+        raise ProcessingError(
+            f"Error occurred while fetching context responses: {e}",
+            e.__class__.__name__,
+        )
+
+
+def _load_context(chunk_ids):
+    """Returns the rows of the docs table for the given chunk ids, in order."""
+    import pandas as pd
+
+    return pd.read_sql_table("docs", get_resources().engine).iloc[chunk_ids]
 
 
-def get_context_response(question):
+def get_context_response(question, filters=None):
     """
     Retrieves relevant context for a given question by querying the FAISS index with the question's embedding.
 
     Parameters:
     - question (str): The question for which context is being sought.
+    - filters (dict, optional): Metadata filters restricting the search, see select_episodes.
 
     Returns:
     - DataFrame: A pandas DataFrame containing the relevant context for the question.
     """
     try:
-        query_embedding = (
-            np.array(get_embeddings(question)).astype("float32").reshape(1, -1)
-        )
-        faiss.normalize_L2(query_embedding)
-        distances, indices = index.search(query_embedding, 5)
-        return pd.read_sql_table("docs", engine).iloc[indices.flatten()]
+        return _load_context(_search_chunks(_embed_question(question), filters)[0])
+    except (RequestValidationError, ProcessingError, OverloadedError):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in get_context_response: {e}")
         raise ProcessingError(
@@ -78,6 +624,96 @@ def get_context_response(question):
         )
 
 
+def get_session_context(session, question, filters=None):
+    """
+    Retrieves relevant context for a question asked within a session. A follow-up close enough to the last
+    searched question reuses that search's results; otherwise the search is steered towards the topic of
+    the conversation by blending the question's embedding with the session summary's.
+
+    Parameters:
+    - session (Session): The session the question is asked in.
+    - question (str): The question for which context is being sought.
+    - filters (dict, optional): Metadata filters restricting the search, see select_episodes.
+
+    Returns:
+    - DataFrame: A pandas DataFrame containing the relevant context for the question.
+    """
+    import faiss
+
+    try:
+        query_embedding = _embed_question(question)
+        with session.lock:
+            last_query_embedding = session.last_query_embedding
+            chunk_ids = session.last_chunk_ids
+            summary_embedding = session.summary_embedding
+            reuse = (
+                last_query_embedding is not None
+                and session.last_filters == filters
+                and float(query_embedding[0] @ last_query_embedding[0])
+                >= Config.SESSION_REUSE_SIMILARITY
+            )
+
+        if not reuse:
+            search_embedding = query_embedding
+            if summary_embedding is not None:
+                search_embedding = (
+                    query_embedding + Config.SESSION_SUMMARY_WEIGHT * summary_embedding
+                )
+                faiss.normalize_L2(search_embedding)
+            chunk_ids = _search_chunks(search_embedding, filters)[0]
+            with session.lock:
+                session.last_query_embedding = query_embedding
+                session.last_chunk_ids = chunk_ids
+                session.last_filters = filters
+
+        return _load_context(chunk_ids)
+    except (RequestValidationError, ProcessingError, OverloadedError):
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error in get_session_context: {e}")
+        raise ProcessingError(
+            f"Error occurred while fetching context response: {e}", e.__class__.__name__
+        )
+
+
+def get_episode_recommendations(message, count=5, filters=None):
+    """
+    Recommends the episodes most related to a message, searching only the coarse episode index.
+
+    Parameters:
+    - message (str): The message to find related episodes for.
+    - count (int): The number of episodes to recommend.
+    - filters (dict, optional): Metadata filters restricting the episodes, see select_episodes.
+
+    Returns:
+    - list: A list of dictionaries, each describing a recommended episode.
+    """
+    if get_resources().episode_index is None:
+        raise ProcessingError(
+            "Episode index is unavailable; rebuild the index to enable recommendations."
+        )
+    try:
+        recommended = search_episodes(_embed_question(message), count, filters)
+    except (RequestValidationError, ProcessingError, OverloadedError):
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error in get_episode_recommendations: {e}")
+        raise ProcessingError(
+            f"Error occurred while fetching episode recommendations: {e}",
+            e.__class__.__name__,
+        )
+    return [
+        {
+            "episode_title": row["title"],
+            "sanitized_title": row["sanitized_title"],
+            "published": row["published"],
+            "youtube_url": row["youtube_url"],
+            "score": float(row["score"]),
+        }
+        for _, row in recommended.iterrows()
+    ]
+
+
 def _convert_to_link(url):
     """
     Converts a YouTube URL to a shorter format by removing milliseconds from the timestamp.
@@ -118,33 +754,52 @@ def format_context_response(context_df):
         )
 
 
-@backoff.on_exception(backoff.expo, openai.error.RateLimitError, max_tries=6)
-def get_openai_response(question, history=""):
+def get_openai_response(
+    question, history="", context_df=None, conversation=None, overran=None
+):
     """
     Generates a response from OpenAI's GPT model based on a given question and previous conversation history.
 
     Parameters:
     - question (str): The question to ask the model.
     - history (str): A string representing the previous conversation history.
+    - context_df (DataFrame, optional): Context already retrieved for the question. Fetched if not given.
+    - conversation (list, optional): Chat messages of a server-side session to send before the question.
+    - overran (threading.Event, optional): Set once the caller has counted the completion as an overrun,
+      after which its outcome is no longer reported to the circuit breaker.
 
     Returns:
     - str: The model's response to the question.
     """
+    openai = _openai()
+    if not completion_breaker.allow():
+        raise OpenAIError(
+            "The OpenAI API is failing; completions are paused.", "CircuitOpen"
+        )
     try:
-        context_df = get_context_response(question)
+        if context_df is None:
+            context_df = get_context_response(question)
         prompt = f"Question: {question}\nContext:\n{' '.join(context_df['text'])}"
-        completion = openai.ChatCompletion.create(
+        completion = _call_openai(
+            completion_admission,
+            openai.ChatCompletion.create,
             model="gpt-3.5-turbo",
             messages=[
                 {
                     "role": "system",
                     "content": "You are a helpful AI who has listened to all of Huberman Lab's podcasts. Provide a response based on the context provided. Your response should be helpful, informative, prescriptive.",
                 },
+                *(conversation or []),
                 {"role": "user", "content": prompt},
             ],
         )
+        # A late success must not close a circuit that its overrun helped open
+        if overran is None or not overran.is_set():
+            completion_breaker.record_success()
         return completion.choices[0].message.content
     except openai.error.OpenAIError as error:
+        if overran is None or not overran.is_set():
+            completion_breaker.record_failure()
         current_app.logger.error(
             f"Error occurred while making the request to OpenAI: {error}"
         )
@@ -157,22 +812,260 @@ def get_openai_response(question, history=""):
         raise
 
 
-def get_humberman_response(message, history):
+def answer_with_context(message, history, context_df, conversation=None):
     """
-    Orchestrates the process of fetching a response for a given message and history,
-    involving OpenAI response generation and context response formatting.
+    Builds the response for a message whose context has already been retrieved.
 
     Parameters:
     - message (str): The message for which a response is sought.
     - history (list): A list of previous messages or conversation history.
+    - context_df (DataFrame): The context retrieved for the message.
+    - conversation (list, optional): Chat messages of a server-side session to send before the message.
 
     Returns:
     - dict: A dictionary containing the OpenAI response and formatted context responses.
     """
-    openai_response = get_openai_response(message, history)
-    context_df = get_context_response(message)
+    openai_response = get_openai_response(message, history, context_df, conversation)
     formatted_context_responses = format_context_response(context_df)
     return {
         "open_ai_response": openai_response,
+        "answer_status": ANSWER_COMPLETE,
         "context_responses": formatted_context_responses,
     }
+
+
+def _submit_completion_task(fn, *args):
+    """
+    Runs a task on the completion executor if one of its workers is free.
+
+    Returns:
+    - Future: The running task, or None if every worker is busy.
+    """
+    if not _completion_workers.acquire(blocking=False):
+        return None
+    try:
+        future = _completion_executor.submit(fn, *args)
+    except Exception:
+        _completion_workers.release()
+        raise
+    future.add_done_callback(lambda _: _completion_workers.release())
+    return future
+
+
+def _complete_in_background(
+    app, deadline, message, history, context_df, conversation, overran
+):
+    """
+    Runs get_openai_response on a completion thread, with its own application context. The completion
+    keeps the deadline of the request it was submitted for.
+    """
+    with app.app_context():
+        upstream.set_deadline(deadline - time.monotonic())
+        try:
+            return get_openai_response(
+                message, history, context_df, conversation, overran
+            )
+        finally:
+            upstream.clear_deadline()
+
+
+def _compact_session(app, session):
+    """
+    Folds all but the SESSION_RECENT_MESSAGES most recent messages of a session into its rolling summary
+    and embeds the new summary. On failure the messages are kept and compaction is retried after the
+    next answer.
+
+    Parameters:
+    - app (Flask): The application, for its context.
+    - session (Session): The session to compact.
+    """
+    import faiss
+    import numpy as np
+
+    with app.app_context():
+        upstream.set_deadline(Config.REQUEST_DEADLINE_SECONDS)
+        try:
+            with session.lock:
+                older = session.messages[: -Config.SESSION_RECENT_MESSAGES]
+                summary = session.summary
+            transcript = "\n".join(
+                f"{message['role']}: {message['content']}" for message in older
+            )
+            completion = _call_openai(
+                completion_admission,
+                _openai().ChatCompletion.create,
+                model="gpt-3.5-turbo",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "Update the summary of a conversation about Huberman Lab's podcasts with the new messages. Keep the topics, questions and advice discussed. Answer with the summary only, in at most 200 words.",
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Summary so far: {summary or '(none)'}\n\nNew messages:\n{transcript}",
+                    },
+                ],
+            )
+            summary = completion.choices[0].message.content
+            summary_embedding = np.array(get_embeddings(summary), dtype="float32")
+            summary_embedding = summary_embedding.reshape(1, -1)
+            faiss.normalize_L2(summary_embedding)
+
+            compacted = {id(message) for message in older}
+            with session.lock:
+                session.summary = summary
+                session.summary_embedding = summary_embedding
+                session.messages = [
+                    message
+                    for message in session.messages
+                    if id(message) not in compacted
+                ]
+        except Exception as e:
+            current_app.logger.warning(f"Could not compact session: {e}")
+        finally:
+            with session.lock:
+                session.compacting = False
+            upstream.clear_deadline()
+
+
+def _record_session_answer(app, session, answer):
+    """Adds an answer to its session, compacting the session in the background when it has grown."""
+    session.add_message("assistant", answer)
+    if session.needs_compaction():
+        with session.lock:
+            session.compacting = True
+        if _submit_completion_task(_compact_session, app, session) is None:
+            # Retried after the next answer
+            with session.lock:
+                session.compacting = False
+
+
+def _store_pending_answer(future):
+    """
+    Keeps a completion that overran its budget so its answer can be fetched later, evicting expired
+    and, beyond MAX_PENDING_ANSWERS, the oldest entries.
+
+    Parameters:
+    - future (Future): The running completion.
+
+    Returns:
+    - str: The token to fetch the answer with.
+    """
+    token = uuid.uuid4().hex
+    now = time.monotonic()
+    with _pending_answers_lock:
+        while _pending_answers and (
+            len(_pending_answers) >= Config.MAX_PENDING_ANSWERS
+            or next(iter(_pending_answers.values()))[0] < now
+        ):
+            _pending_answers.popitem(last=False)
+        _pending_answers[token] = (now + Config.PENDING_ANSWER_TTL_SECONDS, future)
+    return token
+
+
+def get_pending_answer(token):
+    """
+    Looks up the answer of a completion that overran its budget.
+
+    Parameters:
+    - token (str): The token returned with the pending response.
+
+    Returns:
+    - dict: The OpenAI response and answer status, or None if the token is unknown or expired.
+    """
+    with _pending_answers_lock:
+        entry = _pending_answers.get(token)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    future = entry[1]
+    if not future.done():
+        return {"open_ai_response": None, "answer_status": ANSWER_PENDING}
+    if future.exception() is not None:
+        return {"open_ai_response": None, "answer_status": ANSWER_UNAVAILABLE}
+    return {"open_ai_response": future.result(), "answer_status": ANSWER_COMPLETE}
+
+
+def get_humberman_response(message, history, filters=None, session=None):
+    """
+    Orchestrates the process of fetching a response for a given message and history,
+    involving OpenAI response generation and context response formatting.
+
+    In degraded mode the completion gets what is left of ANSWER_BUDGET_SECONDS. If it overruns, fails or the
+    circuit breaker is open, the context responses are returned alone, with an answer_status of "pending"
+    (and an answer_token to fetch the answer later) or "unavailable".
+
+    Parameters:
+    - message (str): The message for which a response is sought.
+    - history (list): A list of previous messages or conversation history.
+    - filters (dict, optional): Metadata filters restricting the context search, see select_episodes.
+    - session (Session, optional): A server-side session providing the conversation, updated with this turn.
+
+    Returns:
+    - dict: A dictionary containing the OpenAI response, its status and formatted context responses.
+    """
+    started = time.monotonic()
+    app = current_app._get_current_object()
+    conversation = None
+    if session is None:
+        context_df = get_context_response(message, filters)
+    else:
+        context_df = get_session_context(session, message, filters)
+        conversation = session.conversation()
+        session.add_message("user", message)
+
+    if not Config.DEGRADED_MODE:
+        response = answer_with_context(message, history, context_df, conversation)
+        if session is not None:
+            _record_session_answer(app, session, response["open_ai_response"])
+        return response
+
+    response = {
+        "open_ai_response": None,
+        "answer_status": ANSWER_UNAVAILABLE,
+        "context_responses": format_context_response(context_df),
+    }
+    if completion_breaker.is_open:
+        current_app.logger.warning("OpenAI circuit is open; returning context only.")
+        return response
+
+    deadline = upstream.current_deadline()
+    if deadline is None:
+        deadline = time.monotonic() + Config.REQUEST_DEADLINE_SECONDS
+    overran = threading.Event()
+    future = _submit_completion_task(
+        _complete_in_background,
+        app,
+        deadline,
+        message,
+        history,
+        context_df,
+        conversation,
+        overran,
+    )
+    if future is None:
+        current_app.logger.warning(
+            "All completion workers are busy; returning context only."
+        )
+        return response
+    if session is not None:
+
+        def record_answer(done):
+            # Answers join the session whenever they finish, including pending ones
+            if done.exception() is None:
+                _record_session_answer(app, session, done.result())
+
+        future.add_done_callback(record_answer)
+    budget = Config.ANSWER_BUDGET_SECONDS - (time.monotonic() - started)
+    try:
+        response["open_ai_response"] = future.result(timeout=max(0.0, budget))
+        response["answer_status"] = ANSWER_COMPLETE
+    except FutureTimeoutError:
+        # A stalled completion counts against the circuit, and its later outcome is not reported
+        overran.set()
+        completion_breaker.record_failure()
+        current_app.logger.warning("OpenAI completion overran its budget.")
+        response["answer_status"] = ANSWER_PENDING
+        response["answer_token"] = _store_pending_answer(future)
+    except (OpenAIError, OverloadedError) as error:
+        current_app.logger.warning(f"Returning context only: {error}")
+    return response
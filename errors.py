@@ -9,6 +9,7 @@ Custom exceptions include:
 - RequestValidationError: For errors related to request payload validation.
 - ProcessingError: For errors that occur during the processing of a request, not related to external API calls.
 - OpenAIError: For errors specifically related to interactions with the OpenAI API.
+- OverloadedError: For requests rejected because the OpenAI API cannot serve them in time.
 
 Each exception includes a message attribute that can be used to convey more information about the error to the client.
 """
@@ -53,3 +54,17 @@ class OpenAIError(Exception):
     ):
         super().__init__(message)
         self.error_type = error_type
+
+
+class OverloadedError(Exception):
+    """
+    Exception raised when a request is shed because upstream capacity is exhausted.
+
+    Attributes:
+    - message (str): Explanation of the error.
+    - retry_after (int): Seconds after which the client may retry.
+    """
+
+    def __init__(self, message="The service is overloaded", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
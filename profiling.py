@@ -0,0 +1,197 @@
+"""
+profiling.py
+
+On-demand profiling of individual requests, for finding out where the time of a slow request goes. A request
+is profiled when it is picked by PROFILE_SAMPLE_RATE, or when it carries an X-Profile-Token header matching
+PROFILE_TOKEN. Requests that are not profiled only pay for a random number and a header lookup.
+
+Two profilers are available, chosen with PROFILE_MODE:
+- "sample" (the default): a background thread records the stack of the request thread every
+  PROFILE_INTERVAL_MS milliseconds. Overhead is low and wall time spent waiting, e.g. on the database or the
+  OpenAI API, shows up in the trace.
+- "cprofile": deterministic cProfile tracing of every call made by the request thread. Exact call counts, but
+  it slows the request down noticeably.
+
+Traces are written to PROFILE_DIR, keeping the PROFILE_MAX_FILES most recent. Sampled traces use the folded
+stack format read by flamegraph.pl and speedscope; cProfile traces are pstats dumps, readable with snakeviz or
+flameprof.
+"""
+
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+
+PROFILE_HEADER = "X-Profile-Token"
+
+logger = logging.getLogger(__name__)
+
+_write_lock = threading.Lock()
+
+
+def requested(headers):
+    """
+    Returns whether the current request should be profiled.
+
+    Parameters:
+    - headers: The request headers.
+    """
+    if Config.PROFILE_SAMPLE_RATE and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return True
+    if Config.PROFILE_TOKEN:
+        token = headers.get(PROFILE_HEADER)
+        return token is not None and hmac.compare_digest(
+            token.encode(), Config.PROFILE_TOKEN.encode()
+        )
+    return False
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval from a background thread.
+
+    Attributes:
+    - thread_id (int): The identifier of the profiled thread.
+    - interval (float): The seconds between samples.
+    - samples (Counter): The number of samples per folded stack, outermost frame first.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+class RequestProfile:
+    """
+    Profiles the thread handling a request, from start() until finish().
+
+    Attributes:
+    - label (str): Describes the request, e.g. "POST /ask_huberman".
+    - mode (str): "sample" or "cprofile".
+    """
+
+    def __init__(self, label, mode):
+        self.label = label
+        self.mode = mode
+        self._profiler = None
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+                return
+            except ValueError:
+                # Only one cProfile may be active at a time on some Python versions
+                self.mode = "sample"
+        self._profiler = SamplingProfiler(
+            threading.get_ident(), Config.PROFILE_INTERVAL_MS / 1000
+        )
+        self._profiler.start()
+
+    def finish(self):
+        """
+        Stops profiling and writes the trace. Failing to write it is logged rather than raised, so that
+        profiling never fails the request.
+
+        Returns:
+        - str: The name of the trace file in PROFILE_DIR, or None if it could not be written.
+        """
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        duration_ms = round(1000 * (time.perf_counter() - self._started))
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.label).strip("_")
+        extension = "prof" if self.mode == "cprofile" else "folded"
+        name = (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+            f"-{slug}-{duration_ms}ms.{extension}"
+        )
+        try:
+            os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+            path = os.path.join(Config.PROFILE_DIR, name)
+            if self.mode == "cprofile":
+                self._profiler.dump_stats(path)
+            else:
+                with open(path, "w") as f:
+                    for stack, count in self._profiler.samples.items():
+                        f.write(f"{self.label};{stack} {count}\n")
+        except Exception as e:
+            logger.warning(f"Could not write the profile of {self.label}: {e}")
+            return None
+        try:
+            _rotate()
+        except Exception as e:
+            logger.warning(
+                f"Could not rotate the profiles in {Config.PROFILE_DIR}: {e}"
+            )
+        return name
+
+
+def start(label):
+    """
+    Starts profiling the current thread.
+
+    Parameters:
+    - label (str): Describes the request, e.g. "POST /ask_huberman".
+
+    Returns:
+    - RequestProfile: The running profile. Call its finish() method when the request ends.
+    """
+    profile = RequestProfile(label, Config.PROFILE_MODE)
+    profile.start()
+    return profile
+
+
+def _rotate():
+    """Deletes the oldest traces beyond PROFILE_MAX_FILES."""
+    with _write_lock:
+        traces = []
+        for entry in os.scandir(Config.PROFILE_DIR):
+            try:
+                if entry.is_file():
+                    traces.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                # Deleted by another process since the directory was listed
+                continue
+        traces.sort()
+        for _, path in traces[: max(0, len(traces) - Config.PROFILE_MAX_FILES)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
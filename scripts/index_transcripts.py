@@ -1,6 +1,8 @@
+import argparse
 import json
 import logging
 import os
+from email.utils import parsedate_to_datetime
 from multiprocessing import Pool
 
 import faiss
@@ -14,6 +16,16 @@ import math
 csv_files_dir = "data/transcribed/youtube"
 JSON_PATH = "HubermanPodcastEpisodes.json"
 
+# Dimension of the first-pass index, and how its recall is measured
+REDUCED_DIM = 256
+REPORT_QUERIES = 500
+REPORT_CANDIDATES = 50
+REPORT_K = 5
+
+# Shards of the chunk index served by separate search workers
+NUM_SHARDS = 4
+SHARDS_DIR = "data/processed/shards"
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -112,7 +124,260 @@ def save_faiss_index(embeddings):
     faiss.write_index(faiss_index, "data/processed/faiss_index.index")
 
 
+def _episode_ranges(embeddings):
+    """
+    Find the contiguous chunk id range of every episode.
+
+    Args:
+        embeddings (np.ndarray): The embeddings, in faiss index order.
+
+    Returns:
+        list: (start_id, end_id) tuples, one per episode, in index order.
+    """
+    titles = embeddings["sanitized_title"]
+    if not len(titles):
+        return []
+    boundaries = np.flatnonzero(titles[1:] != titles[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(titles)]])
+    return list(zip(starts, ends))
+
+
+def save_episode_index(embeddings):
+    """
+    Save a coarse faiss index holding one centroid per episode.
+
+    Rows follow the episode order of save_episode_metadata, so a row number is an episode_id.
+
+    Args:
+        embeddings (np.ndarray): The embeddings, in faiss index order.
+    """
+    embeddings_np = np.vstack([x[0] for x in embeddings]).astype("float32")
+    faiss.normalize_L2(embeddings_np)
+    centroids = np.vstack(
+        [
+            embeddings_np[start_id:end_id].mean(axis=0)
+            for start_id, end_id in _episode_ranges(embeddings)
+        ]
+    )
+    faiss.normalize_L2(centroids)
+    episode_index = faiss.IndexFlatIP(centroids.shape[1])
+    episode_index.add(centroids)
+    faiss.write_index(episode_index, "data/processed/episode_index.index")
+
+
+def _normalized_vectors(embeddings):
+    """
+    Stack the embedding vectors into a normalized float32 matrix.
+
+    Args:
+        embeddings (np.ndarray): The embeddings, in faiss index order.
+
+    Returns:
+        np.ndarray: One L2-normalized row per chunk.
+    """
+    vectors = np.vstack([x[0] for x in embeddings]).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def save_reduced_index(embeddings, dim=REDUCED_DIM):
+    """
+    Save a first-pass faiss index over PCA-reduced vectors, and the full vectors for re-ranking.
+
+    Only the projection learned by PCA is kept, as a bias-free LinearTransform: the bias would skew inner
+    products in the reduced space, and a saved PCAMatrix would also carry its full d_in x d_in eigenvector
+    matrix into the API's memory. The full vectors are saved as a .npy file that the API memory-maps,
+    reading only the rows of first-pass candidates.
+
+    Args:
+        embeddings (np.ndarray): The embeddings, in faiss index order.
+        dim (int): The dimension of the reduced vectors.
+    """
+    vectors = _normalized_vectors(embeddings)
+    pca = faiss.PCAMatrix(vectors.shape[1], dim)
+    pca.train(vectors)
+    projection = faiss.LinearTransform(vectors.shape[1], dim, False)
+    faiss.copy_array_to_vector(faiss.vector_to_array(pca.A), projection.A)
+    projection.is_trained = True
+    reduced_index = faiss.IndexPreTransform(projection, faiss.IndexFlatIP(dim))
+    reduced_index.add(vectors)
+    faiss.write_index(reduced_index, "data/processed/faiss_index_reduced.index")
+    np.save("data/processed/chunk_vectors.npy", vectors)
+    report_reduced_index(vectors, reduced_index, dim)
+
+
+def report_reduced_index(vectors, reduced_index, dim):
+    """
+    Log and save the memory saved by the reduced index and the recall@REPORT_K it retains.
+
+    Sampled chunks serve as queries, excluding themselves from the results. The ground truth is an exact
+    search over the full vectors; the reduced search keeps REPORT_CANDIDATES candidates, re-ranked exactly.
+
+    Args:
+        vectors (np.ndarray): The normalized full vectors.
+        reduced_index (faiss.Index): The first-pass index over the reduced vectors.
+        dim (int): The dimension of the reduced vectors.
+    """
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(vectors), min(REPORT_QUERIES, len(vectors)), False)
+    queries = vectors[query_ids]
+
+    exact_index = faiss.IndexFlatIP(vectors.shape[1])
+    exact_index.add(vectors)
+    _, exact_ids = exact_index.search(queries, REPORT_K + 1)
+    _, candidate_ids = reduced_index.search(queries, REPORT_CANDIDATES + 1)
+
+    hits = 0
+    for query_id, query, exact, candidates in zip(
+        query_ids, queries, exact_ids, candidate_ids
+    ):
+        candidates = candidates[(candidates >= 0) & (candidates != query_id)]
+        reranked = candidates[np.argsort(-(vectors[candidates] @ query))][:REPORT_K]
+        expected = exact[exact != query_id][:REPORT_K]
+        hits += len(set(reranked) & set(expected))
+
+    full_bytes = vectors.nbytes
+    # The size of the index as saved and loaded by the API, projection included
+    reduced_bytes = faiss.serialize_index(reduced_index).nbytes
+    report = {
+        "chunks": len(vectors),
+        "reduced_dim": dim,
+        "full_index_mb": round(full_bytes / 2**20, 1),
+        "reduced_index_mb": round(reduced_bytes / 2**20, 1),
+        "memory_saved": round(1 - reduced_bytes / full_bytes, 3),
+        "candidates": REPORT_CANDIDATES,
+        f"recall@{REPORT_K}": round(hits / (REPORT_K * len(query_ids)), 3),
+    }
+    logger.info(f"Reduced index report: {report}")
+    with open("data/processed/reduced_index_report.json", "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def save_shards(embeddings, num_shards=NUM_SHARDS, rebuild=()):
+    """
+    Split the chunks into shards by episode and save a faiss index per shard, along with the global
+    chunk id of each of its rows.
+
+    Episodes keep their shard across runs, recorded in shards.json, and new episodes go to the smallest
+    shard. Only shards whose episodes changed, whose files are missing or that are listed in rebuild are
+    written, so shards can be rebuilt independently.
+
+    Args:
+        embeddings (np.ndarray): The embeddings, in faiss index order.
+        num_shards (int): The number of shards. Changing it reassigns every episode.
+        rebuild (iterable): Shards to rebuild even if unchanged.
+    """
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    manifest_path = os.path.join(SHARDS_DIR, "shards.json")
+    assignments = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest["num_shards"] == num_shards:
+            assignments = manifest["episodes"]
+
+    titles = embeddings["sanitized_title"]
+    ranges = _episode_ranges(embeddings)
+    sizes = [0] * num_shards
+    for start_id, end_id in ranges:
+        if str(titles[start_id]) in assignments:
+            sizes[assignments[str(titles[start_id])]] += end_id - start_id
+
+    changed = set(rebuild)
+    for start_id, end_id in ranges:
+        title = str(titles[start_id])
+        if title not in assignments:
+            shard_id = int(np.argmin(sizes))
+            assignments[title] = shard_id
+            sizes[shard_id] += end_id - start_id
+            changed.add(shard_id)
+
+    vectors = _normalized_vectors(embeddings)
+    for shard_id in range(num_shards):
+        index_path = os.path.join(SHARDS_DIR, f"shard_{shard_id}.index")
+        if shard_id not in changed and os.path.exists(index_path):
+            continue
+        chunk_ids = np.concatenate(
+            [np.empty(0, dtype="int64")]
+            + [
+                np.arange(start_id, end_id, dtype="int64")
+                for start_id, end_id in ranges
+                if assignments[str(titles[start_id])] == shard_id
+            ]
+        )
+        shard_index = faiss.IndexFlatIP(vectors.shape[1])
+        shard_index.add(vectors[chunk_ids])
+        faiss.write_index(shard_index, index_path)
+        np.save(os.path.join(SHARDS_DIR, f"shard_{shard_id}_ids.npy"), chunk_ids)
+        logger.info(f"Saved shard {shard_id} with {len(chunk_ids)} chunks")
+
+    with open(manifest_path, "w") as f:
+        json.dump({"num_shards": num_shards, "episodes": assignments}, f, indent=4)
+
+
+def _published_date(published):
+    """
+    Convert an RSS publication timestamp to an ISO date.
+
+    Args:
+        published (str): The RSS timestamp, e.g. "Mon, 04 Sep 2023 08:00:00 -0000".
+
+    Returns:
+        str: The date as YYYY-MM-DD, or an empty string if it cannot be parsed.
+    """
+    try:
+        return parsedate_to_datetime(published).date().isoformat()
+    except (TypeError, ValueError):
+        return ""
+
+
+def save_episode_metadata(embeddings, episodes):
+    """
+    Save a per-episode metadata table used to filter searches.
+
+    Chunks of an episode are stored contiguously in the faiss index, so each
+    episode maps to the half-open id range [start_id, end_id).
+
+    Args:
+        embeddings (np.ndarray): The embeddings, in faiss index order.
+        episodes (list): The episode data loaded from JSON_PATH.
+    """
+    episodes_by_title = {episode["sanitized_title"]: episode for episode in episodes}
+    titles = embeddings["sanitized_title"]
+
+    rows = []
+    for episode_id, (start_id, end_id) in enumerate(_episode_ranges(embeddings)):
+        sanitized_title = titles[start_id]
+        episode = episodes_by_title.get(sanitized_title, {})
+        rows.append(
+            {
+                "episode_id": episode_id,
+                "sanitized_title": sanitized_title,
+                "title": episode.get("title", sanitized_title),
+                "published": _published_date(episode.get("published")),
+                "youtube_url": episode.get("youtube_url"),
+                "start_id": int(start_id),
+                "end_id": int(end_id),
+            }
+        )
+    pd.DataFrame(rows).to_csv("data/processed/episodes.csv", index=False)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Embed and index podcast transcripts.")
+    parser.add_argument(
+        "--shards", type=int, default=NUM_SHARDS, help="number of search shards"
+    )
+    parser.add_argument(
+        "--rebuild-shard",
+        type=int,
+        action="append",
+        default=[],
+        help="rebuild this shard even if its episodes are unchanged (repeatable)",
+    )
+    args = parser.parse_args()
+
     # Load original embeddings
     original_embeddings_path = "data/processed/embeddings.npy"
     if os.path.exists(original_embeddings_path):
@@ -152,6 +417,10 @@ def main():
 
     save_embeddings(final_embeddings)
     save_faiss_index(final_embeddings)
+    save_episode_metadata(final_embeddings, episodes)
+    save_episode_index(final_embeddings)
+    save_reduced_index(final_embeddings)
+    save_shards(final_embeddings, args.shards, args.rebuild_shard)
 
 
 if __name__ == "__main__":
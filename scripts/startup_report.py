@@ -0,0 +1,152 @@
+"""
+Report on the cost of starting the API.
+
+First runs `python -X importtime -c "import app"` and lists the slowest imports, then starts the
+application in the given STARTUP_MODE and measures the time to its first healthy (/live) and ready
+(/ready) responses. Imports are always timed with STARTUP_MODE=lazy, so that modules loaded by a warm-up
+thread are not mixed into the report.
+Exits with status 1 if the time to the first healthy response misses the target.
+
+Run from anywhere:
+    python scripts/startup_report.py --mode background --target 2.0
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+# Seconds from process start to the first successful /live response
+DEFAULT_TARGET_SECONDS = 2.0
+
+
+def import_times(env):
+    """
+    Measure module import times when importing the application.
+
+    Args:
+        env (dict): The environment to import the application with.
+
+    Returns:
+        list: (cumulative_us, self_us, depth, module) tuples in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing the application failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            times.append((int(cumulative_us), int(self_us), len(indent) // 2, module))
+    return times
+
+
+def wait_for(url, process, timeout):
+    """
+    Poll a URL until it answers with HTTP 200.
+
+    Args:
+        url (str): The URL to poll.
+        process (subprocess.Popen): The server process, checked for early exit.
+        timeout (float): Seconds to wait before giving up.
+
+    Returns:
+        bool: Whether the URL answered with HTTP 200 in time.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--mode",
+        choices=["background", "lazy", "eager"],
+        default="background",
+        help="STARTUP_MODE to start the application with for the /live and /ready timings",
+    )
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument(
+        "--target",
+        type=float,
+        default=DEFAULT_TARGET_SECONDS,
+        help="maximum seconds to the first healthy response",
+    )
+    parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=120.0,
+        help="seconds to wait for the application to become ready",
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ, STARTUP_MODE=args.mode, FLASK_APP="app.py")
+
+    # A warm-up thread would interleave its own imports with those of the app
+    times = import_times(dict(env, STARTUP_MODE="lazy"))
+    total_us = sum(self_us for _, self_us, _, _ in times)
+    print(f"Importing app: {total_us / 1e6:.3f}s across {len(times)} modules")
+    print("Slowest top-level imports:")
+    top_level = sorted((t for t in times if t[2] == 0), reverse=True)[: args.top]
+    for cumulative_us, _, _, module in top_level:
+        print(f"  {cumulative_us / 1e6:8.3f}s  {module}")
+
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "run", "--port", str(args.port)],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        healthy = wait_for(f"{base_url}/live", process, args.ready_timeout)
+        time_to_healthy = time.monotonic() - started
+        ready = healthy and wait_for(f"{base_url}/ready", process, args.ready_timeout)
+        time_to_ready = time.monotonic() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    if not healthy:
+        sys.exit("The application never answered /live.")
+    print(f"Time to first healthy response: {time_to_healthy:.3f}s")
+    if ready:
+        print(f"Time to ready: {time_to_ready:.3f}s")
+    else:
+        print(f"Not ready after {args.ready_timeout:.0f}s")
+
+    if time_to_healthy > args.target:
+        print(f"FAIL: target is {args.target:.3f}s")
+        sys.exit(1)
+    print(f"OK: target is {args.target:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+sessions.py
+
+Keeps conversations on the server so clients only send the new message of each turn. Sessions live in memory,
+are evicted after SESSION_TTL_SECONDS of inactivity or, beyond MAX_SESSIONS, least recently used first.
+
+A session holds its most recent messages verbatim and a rolling summary of older ones, together with the
+embedding of that summary and the last retrieval, so follow-up questions can reuse earlier search results.
+The engine compacts the messages into the summary; this module only stores them.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+class Session:
+    """
+    A conversation kept on the server.
+
+    Attributes:
+    - id (str): The session id sent by clients.
+    - summary (str): A summary of the compacted messages, or an empty string.
+    - summary_embedding (ndarray): The normalized (1, d) embedding of the summary, or None.
+    - messages (list): The messages not yet compacted, as {"role": ..., "content": ...} dictionaries.
+    - last_query_embedding (ndarray): The normalized (1, d) embedding of the last searched question, or None.
+    - last_chunk_ids (ndarray): The chunk ids found by the last search.
+    - last_filters (dict): The filters of the last search.
+    - compacting (bool): Whether a compaction is running.
+    - lock (threading.Lock): Guards the attributes above.
+    """
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.summary = ""
+        self.summary_embedding = None
+        self.messages = []
+        self.last_query_embedding = None
+        self.last_chunk_ids = None
+        self.last_filters = None
+        self.compacting = False
+        self.lock = threading.Lock()
+
+    def add_message(self, role, content):
+        """
+        Appends a message. If compaction keeps failing, the oldest messages are dropped so that a
+        session never holds more than three times SESSION_RECENT_MESSAGES.
+        """
+        with self.lock:
+            self.messages.append({"role": role, "content": content})
+            del self.messages[: -3 * Config.SESSION_RECENT_MESSAGES]
+
+    def needs_compaction(self):
+        """Returns whether enough messages have accumulated to fold the older ones into the summary."""
+        with self.lock:
+            return (
+                not self.compacting
+                and len(self.messages) > 2 * Config.SESSION_RECENT_MESSAGES
+            )
+
+    def conversation(self):
+        """
+        Returns the chat messages to send before a new question: the summary, if any, followed by
+        the messages not yet compacted. Its size is bounded however long the conversation runs.
+        """
+        with self.lock:
+            conversation = list(self.messages)
+            if self.summary:
+                conversation.insert(
+                    0,
+                    {
+                        "role": "system",
+                        "content": f"Summary of the earlier conversation: {self.summary}",
+                    },
+                )
+        return conversation
+
+
+class SessionStore:
+    """
+    An in-memory store of sessions with least-recently-used and time-based eviction.
+
+    Attributes:
+    - max_sessions (int): The maximum number of sessions kept.
+    - ttl_seconds (float): The seconds of inactivity after which a session expires.
+    """
+
+    def __init__(self, max_sessions, ttl_seconds):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """Drops expired sessions, then the least recently used ones beyond max_sessions."""
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions
+            or next(iter(self._sessions.values()))[0] + self.ttl_seconds < now
+        ):
+            self._sessions.popitem(last=False)
+
+    def create(self):
+        """Creates and returns a new session."""
+        session = Session(secrets.token_urlsafe(16))
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session.id] = (now, session)
+            self._evict(now)
+        return session
+
+    def get(self, session_id):
+        """Returns the session with the given id, or None if it is unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (now, entry[1])
+        return entry[1]
+
+
+store = SessionStore(Config.MAX_SESSIONS, Config.SESSION_TTL_SECONDS)
@@ -0,0 +1,131 @@
+"""
+shard_worker.py
+
+Serves searches over one shard of the chunk index on a Unix socket. The API starts one worker per shard when
+SHARDED_SEARCH is enabled; with SPAWN_SHARD_WORKERS=false they can be run separately instead, e.g. by a process
+manager, so that several API processes share them:
+
+    python shard_worker.py 0
+
+Each request is a (query_embeddings, k, ranges) tuple, ranges being (start_id, end_id) global chunk id ranges
+to restrict the search to, or None. Each response is a (distances, chunk_ids) tuple of (n, k) arrays, with
+global chunk ids padded with -1.
+"""
+
+import argparse
+import logging
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Listener
+
+import faiss
+import numpy as np
+
+import shards
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Filters cached per worker, matching the engine's cache of filter ranges
+SELECTOR_CACHE_SIZE = 256
+
+
+class ShardSearcher:
+    """
+    Searches one shard, translating between its row numbers and global chunk ids.
+
+    Attributes:
+    - index (faiss.Index): The shard's index.
+    - chunk_ids (ndarray): The sorted global chunk id of every row of the index.
+    """
+
+    def __init__(self, index, chunk_ids):
+        self.index = index
+        self.chunk_ids = chunk_ids
+        self._params = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _search_parameters(self, ranges):
+        """
+        Builds, or returns the cached, search parameters selecting the rows within the given ranges. The
+        SELECTOR_CACHE_SIZE most recently used are kept.
+
+        Returns:
+        - tuple: The SearchParameters and the objects it references, or None if no row is selected.
+        """
+        with self._lock:
+            if ranges in self._params:
+                self._params.move_to_end(ranges)
+                return self._params[ranges]
+        mask = np.zeros(len(self.chunk_ids), dtype=bool)
+        for start_id, end_id in ranges:
+            mask[
+                np.searchsorted(self.chunk_ids, start_id) : np.searchsorted(
+                    self.chunk_ids, end_id
+                )
+            ] = True
+        params = None
+        if mask.any():
+            bitmap = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(bitmap)
+            params = (faiss.SearchParameters(sel=selector), selector, bitmap)
+        with self._lock:
+            self._params[ranges] = params
+            while len(self._params) > SELECTOR_CACHE_SIZE:
+                self._params.popitem(last=False)
+        return params
+
+    def search(self, query_embeddings, k, ranges=None):
+        """Searches the shard, returning distances and global chunk ids."""
+        search_kwargs = {}
+        if ranges is not None:
+            params = self._search_parameters(ranges)
+            if params is None:
+                return (
+                    np.full((len(query_embeddings), k), -np.inf, dtype="float32"),
+                    np.full((len(query_embeddings), k), -1, dtype="int64"),
+                )
+            search_kwargs["params"] = params[0]
+        distances, rows = self.index.search(query_embeddings, k, **search_kwargs)
+        return distances, np.where(rows >= 0, self.chunk_ids[rows], -1)
+
+
+def serve(searcher, connection):
+    """Answers the requests sent over one connection until the client disconnects."""
+    with connection:
+        while True:
+            try:
+                query_embeddings, k, ranges = connection.recv()
+            except EOFError:
+                return
+            connection.send(searcher.search(query_embeddings, k, ranges))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve searches over one shard.")
+    parser.add_argument("shard_id", type=int, help="the shard to serve")
+    args = parser.parse_args()
+
+    searcher = ShardSearcher(
+        faiss.read_index(shards.index_path(args.shard_id)),
+        np.load(shards.ids_path(args.shard_id)),
+    )
+    address = shards.socket_path(args.shard_id)
+    os.makedirs(os.path.dirname(address), mode=0o700, exist_ok=True)
+    if os.path.exists(address):
+        os.remove(address)
+
+    with Listener(address, family="AF_UNIX") as listener:
+        logger.info(
+            f"Serving shard {args.shard_id} ({searcher.index.ntotal} chunks) on {address}"
+        )
+        while True:
+            connection = listener.accept()
+            threading.Thread(
+                target=serve, args=(searcher, connection), daemon=True
+            ).start()
+
+
+if __name__ == "__main__":
+    main()
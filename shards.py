@@ -0,0 +1,144 @@
+"""
+shards.py
+
+Scatter-gather search over an index split into shards by episode. Each shard is served by a shard_worker.py
+process on a Unix socket, so shards are searched in parallel across cores and can be rebuilt independently.
+ShardedSearcher sends a query to every shard at once and merges the per-shard top-k.
+
+scripts/index_transcripts.py writes the shards to SHARDS_DIR: a FAISS index and the global chunk ids of its
+rows per shard, and a shards.json manifest recording the shard of every episode.
+"""
+
+import atexit
+import json
+import os
+import queue
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client
+
+from config import Config
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def index_path(shard_id):
+    """Returns the path of a shard's FAISS index."""
+    return os.path.join(Config.SHARDS_DIR, f"shard_{shard_id}.index")
+
+
+def ids_path(shard_id):
+    """Returns the path of the global chunk ids of a shard's rows."""
+    return os.path.join(Config.SHARDS_DIR, f"shard_{shard_id}_ids.npy")
+
+
+def socket_path(shard_id):
+    """Returns the path of the Unix socket a shard is served on."""
+    return os.path.join(Config.SHARD_SOCKET_DIR, f"shard_{shard_id}.sock")
+
+
+def read_manifest():
+    """Returns the shards.json manifest, or None if the index has not been sharded."""
+    manifest_path = os.path.join(Config.SHARDS_DIR, "shards.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+class ShardedSearcher:
+    """
+    Searches all shards in parallel through their workers and merges the results.
+
+    Attributes:
+    - num_shards (int): The number of shards.
+    """
+
+    def __init__(self, num_shards, spawn_workers=True):
+        self.num_shards = num_shards
+        self._processes = []
+        # Connections are not thread-safe, so each search borrows one per shard
+        self._connections = [queue.SimpleQueue() for _ in range(num_shards)]
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * num_shards, thread_name_prefix="shard-search"
+        )
+        if spawn_workers:
+            os.makedirs(Config.SHARD_SOCKET_DIR, mode=0o700, exist_ok=True)
+            self._processes = [
+                subprocess.Popen(
+                    [sys.executable, "shard_worker.py", str(shard_id)], cwd=ROOT_DIR
+                )
+                for shard_id in range(num_shards)
+            ]
+            atexit.register(self.close)
+        # Fail at startup rather than on the first search if a worker is missing
+        for shard_id in range(num_shards):
+            self._connections[shard_id].put(
+                self._connect(shard_id, Config.SHARD_STARTUP_TIMEOUT_SECONDS)
+            )
+
+    def _connect(self, shard_id, timeout=0):
+        """Connects to a shard worker, retrying until it listens or timeout seconds pass."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(socket_path(shard_id), family="AF_UNIX")
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    def _search_shard(self, shard_id, query_embeddings, k, ranges):
+        """Searches one shard, returning its distances and global chunk ids."""
+        connections = self._connections[shard_id]
+        try:
+            connection = connections.get_nowait()
+        except queue.Empty:
+            connection = self._connect(shard_id)
+        try:
+            connection.send((query_embeddings, k, ranges))
+            result = connection.recv()
+        except (EOFError, OSError):
+            connection.close()
+            raise
+        connections.put(connection)
+        return result
+
+    def search(self, query_embeddings, k, ranges=None):
+        """
+        Searches every shard and merges the per-shard results.
+
+        Parameters:
+        - query_embeddings (ndarray): The normalized (n, d) query embeddings.
+        - k (int): The number of results per query.
+        - ranges (tuple, optional): (start_id, end_id) global chunk id ranges to restrict the search to.
+
+        Returns:
+        - tuple: (n, k) arrays of inner products and global chunk ids, best first, padded with -1 ids.
+        """
+        import numpy as np
+
+        futures = [
+            self._executor.submit(
+                self._search_shard, shard_id, query_embeddings, k, ranges
+            )
+            for shard_id in range(self.num_shards)
+        ]
+        results = [future.result() for future in futures]
+        distances = np.hstack([distances for distances, _ in results])
+        chunk_ids = np.hstack([chunk_ids for _, chunk_ids in results])
+        best = np.argsort(-distances, axis=1)[:, :k]
+        return (
+            np.take_along_axis(distances, best, axis=1),
+            np.take_along_axis(chunk_ids, best, axis=1),
+        )
+
+    def close(self):
+        """Stops the workers started by this searcher."""
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.wait()
+        self._processes = []
@@ -0,0 +1,216 @@
+"""
+upstream.py
+
+Protects the OpenAI API, and the workers waiting on it, from traffic spikes. An AdmissionController bounds how
+many calls are in flight, the rate at which they start and how many callers may queue for a slot. A caller that
+cannot be admitted before its request deadline is rejected at once with OverloadedError, which the API answers
+with 503 and a Retry-After header instead of piling the request into retries.
+
+A CircuitBreaker stops calling the OpenAI API after repeated failures, so requests can fall back to
+retrieval-only answers at once instead of waiting on a service that is down.
+
+Request deadlines are tracked per thread: the application sets one when a request starts and clears it when
+the request ends.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from errors import OverloadedError
+
+_local = threading.local()
+
+
+def set_deadline(seconds):
+    """
+    Sets the deadline of the request handled by the current thread.
+
+    Parameters:
+    - seconds (float): Seconds from now until the deadline, or None for no deadline.
+    """
+    _local.deadline = None if seconds is None else time.monotonic() + seconds
+
+
+def clear_deadline():
+    """Clears the deadline of the current thread."""
+    _local.deadline = None
+
+
+def current_deadline():
+    """Returns the deadline of the current thread as a time.monotonic() value, or None."""
+    return getattr(_local, "deadline", None)
+
+
+def remaining_time():
+    """Returns the seconds left before the current thread's deadline, or None if there is none."""
+    deadline = current_deadline()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class AdmissionController:
+    """
+    Limits the calls to an upstream API with a concurrency limit, a token bucket and a bounded wait queue.
+
+    Attributes:
+    - name (str): The name used in error messages.
+    - max_concurrent (int): The maximum number of calls in flight.
+    - rate (float): The number of calls allowed to start per second, or 0 for no rate limit.
+    - burst (float): The number of calls allowed to start at once after an idle period.
+    - max_waiting (int): The maximum number of callers queued for a slot.
+    """
+
+    def __init__(self, name, max_concurrent, rate=0, max_waiting=32, burst=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_waiting = max_waiting
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        """Adds the tokens accrued since the last refill."""
+        if self.rate:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def _token_wait(self):
+        """Returns the seconds until the next token is available."""
+        if not self.rate or self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _retry_after(self):
+        """Estimates the whole seconds until a rejected caller could be admitted."""
+        if self.rate:
+            return max(1, math.ceil(self._token_wait() + self._waiting / self.rate))
+        return 1
+
+    def _reject(self, reason):
+        raise OverloadedError(
+            f"The {self.name} service is overloaded: {reason}. Please retry later.",
+            retry_after=self._retry_after(),
+        )
+
+    def acquire(self, deadline=None):
+        """
+        Waits for a free slot and a token.
+
+        Parameters:
+        - deadline (float, optional): A time.monotonic() value after which the caller gives up.
+
+        Raises:
+        - OverloadedError: If the wait queue is full or the caller cannot be admitted before its deadline.
+        """
+        with self._condition:
+            if self._waiting >= self.max_waiting:
+                self._reject("too many requests are queued")
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    token_wait = self._token_wait()
+                    if self._in_flight < self.max_concurrent and token_wait == 0:
+                        if self.rate:
+                            self._tokens -= 1
+                        self._in_flight += 1
+                        return
+                    # Without a free slot, wait to be notified by release()
+                    wait = token_wait if self._in_flight < self.max_concurrent else None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            self._reject("the request deadline would be exceeded")
+                        wait = remaining if wait is None else wait
+                    self._condition.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def release(self):
+        """Frees the slot taken by acquire()."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, deadline=None):
+        """Holds a slot for the duration of a with block, see acquire()."""
+        self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream API that keeps failing. After failure_threshold consecutive failures the circuit
+    opens and calls are refused for reset_timeout seconds. A single trial call is then let through, and its
+    outcome closes the circuit or opens it again.
+
+    Attributes:
+    - failure_threshold (int): The consecutive failures that open the circuit.
+    - reset_timeout (float): The seconds to wait before a trial call.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started = None
+
+    def _trial_due(self, now):
+        """Returns whether a trial call may be let through."""
+        if now - self._opened_at < self.reset_timeout:
+            return False
+        # A trial whose outcome was never recorded does not block the circuit forever
+        return (
+            self._trial_started is None
+            or now - self._trial_started >= self.reset_timeout
+        )
+
+    @property
+    def is_open(self):
+        """Whether calls are currently refused, without claiming the trial call."""
+        with self._lock:
+            return self._opened_at is not None and not self._trial_due(time.monotonic())
+
+    def allow(self):
+        """
+        Returns whether a call may be made. While the circuit is open, claims the trial call when it is due.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if not self._trial_due(now):
+                return False
+            self._trial_started = now
+            return True
+
+    def record_success(self):
+        """Closes the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        """Counts a failure, opening the circuit once failure_threshold is reached."""
+        with self._lock:
+            self._failures += 1
+            self._trial_started = None
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()